@@ -1,9 +1,67 @@
-import os
 import time
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse
 from progress import Progress
-from random import choice
 
-WEB_DATA = os.path.join(os.path.dirname(__file__), 'school_web.txt')
+# Numba is optional: without it the walk falls back to batched NumPy
+try:
+    from numba import njit, prange, get_num_threads, get_thread_id
+except ImportError:
+    njit = None
+    prange = range
+    get_num_threads = lambda: 1
+    get_thread_id = lambda: 0
+
+# the Cython walk kernel is optional as well: it covers installations
+# without Numba once built with `python setup.py build_ext --inplace`
+try:
+    import walk as cython_walk
+except ImportError:
+    cython_walk = None
+
+# CUDA support is optional too: used only when a GPU is present
+try:
+    from numba import cuda
+    from numba.cuda.random import (create_xoroshiro128p_states,
+                                   xoroshiro128p_uniform_float32)
+except ImportError:
+    cuda = None
+
+# cupy is optional: its sparse module runs the power iteration on the
+# GPU through cuSPARSE
+try:
+    import cupy as cp
+    import cupyx.scipy.sparse as cpsp
+except ImportError:
+    cp = None
+
+WEB_DATA = Path(__file__).parent / 'school_web.txt'
+
+
+class Graph:
+    """Directed web graph in compressed sparse row (CSR) form
+
+    Attributes:
+    urls -- list assigning each integer node id its URL
+    url_to_idx -- dict mapping each URL back to its node id
+    indptr, indices -- int32 CSR adjacency arrays; the targets of
+                       node i are indices[indptr[i]:indptr[i+1]]
+
+    Keeping the adjacency in two flat contiguous arrays instead of a
+    dict of lists means a walk step touches two small array slots
+    rather than several scattered Python objects.
+    """
+    def __init__(self, urls, url_to_idx, indptr, indices):
+        self.urls = urls
+        self.url_to_idx = url_to_idx
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        """Number of nodes in the graph"""
+        return len(self.urls)
 
 
 def load_graph(fd):
@@ -13,33 +71,178 @@ def load_graph(fd):
     fd -- a file like object that contains lines of URL pairs
 
     Returns:
-    A representation of the graph.
+    A Graph holding the parsed web in CSR form.
 
     Called for example with
 
-    >>> graph = load_graph(open("web.txt"))
+    >>> graph = load_graph(open("web.txt", "rb"))
 
     the function parses the input file and returns a graph representation.
     Each line in the file contains two white space seperated URLs and
     denotes a directed edge (link) from the first URL to the second.
     """
-    graph = {}
-    # Iterate through the file line by line
-    for line in fd:
-        # And split each line into two URLs
-        node, target = line.split()
-        # if graph contains an array for node, append target to it
-        if node in graph:
-            graph[node].append(target)
-        # else initialise an array for node containing target
-        else:
-            graph[node] = [target]
-    return graph
+    # slurp the file as one bytes object and split it on whitespace:
+    # no per-line Python string handling or decoding
+    buf = fd.read()
+    if isinstance(buf, str):
+        buf = buf.encode()
+    tokens = np.array(buf.split())
+    # intern the URLs and get the integer node id of every token in
+    # one pass; tokens alternate source, target, source, target, ...
+    cats, codes = np.unique(tokens, return_inverse=True)
+    codes = codes.astype(np.int32)
+    rows = codes[0::2]
+    cols = codes[1::2]
+    urls = [url.decode() for url in cats]
+    url_to_idx = {url: idx for idx, url in enumerate(urls)}
+    n = len(urls)
+    # group the edges by source node to obtain the CSR layout
+    order = np.argsort(rows, kind='stable')
+    indices = cols[order]
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=n))
+    return Graph(urls, url_to_idx, indptr, indices)
+
+
+def build_transition_matrix(graph):
+    """Build the sparse transition matrix of the given graph
+
+    Parameters:
+    graph -- a Graph object as returned by load_graph()
+
+    Returns:
+    A scipy.sparse CSR matrix with M[i,j] holding the probability that
+    a random walker on node i steps to node j, i.e. 1 divided by the
+    out degree of i.
+    """
+    n = len(graph)
+    # weight every edge of node i by 1/out-degree of i; float32 is
+    # plenty for ranking and halves the bytes the memory-bound SpMV
+    # has to move
+    deg = np.diff(graph.indptr)
+    data = np.repeat((1 / deg).astype(np.float32), deg)
+    return scipy.sparse.csr_matrix((data, graph.indices, graph.indptr),
+                                   shape=(n, n))
+
+
+def _walk(indptr, indices, starts, n_steps, n):
+    """Run one random walk of n_steps per entry of starts
+
+    Parameters:
+    indptr, indices -- CSR adjacency arrays, the targets of node i
+                       are indices[indptr[i]:indptr[i+1]]
+    starts -- array of start node ids, one per walk
+    n_steps (int) -- number of followed links before a walk is stopped
+    n (int) -- number of nodes in the graph
+
+    Returns:
+    An array assigning each node id its hit frequency
+
+    With Numba installed this scalar double loop is compiled to
+    machine code and the walks are spread across all CPU cores.
+    The walkers are independent, so the outer loop parallelizes with
+    no synchronization: each thread accumulates hits into its own row
+    of counts (Numba keeps a thread-local RNG state per worker) and
+    the rows are summed once at the end.
+    """
+    n_iter = len(starts)
+    # accumulate raw integer hits; dividing by n_iter once at the end
+    # avoids a float divide per walk and any accumulated rounding
+    counts = np.zeros((get_num_threads(), n), dtype=np.int64)
+    for it in prange(n_iter):
+        cur = starts[it]
+        for x in range(n_steps):
+            start = indptr[cur]
+            deg = indptr[cur + 1] - start
+            # Lemire multiply-shift: map a full-width 32-bit draw onto
+            # [0, deg) with one multiply, avoiding the rejection loop
+            # (and its data-dependent branch) inside randint(0, deg)
+            r = np.uint64(np.random.randint(0, 4294967296))
+            offset = (r * np.uint64(deg)) >> np.uint64(32)
+            cur = indices[start + np.int64(offset)]
+        counts[get_thread_id(), cur] += 1
+    return counts.sum(axis=0) / n_iter
+
+
+if njit is not None:
+    # parallel kernels cannot be disk-cached (the threading runtime
+    # injects dynamic ctypes pointers), so this one recompiles per
+    # process; _pr_step below is cached
+    _walk = njit(_walk, parallel=True)
+
+
+def _pr_step(indptr, indices, inv_deg, p_in, p_out):
+    """Perform one PageRank distribution update over a CSR adjacency
+
+    Parameters:
+    indptr, indices -- CSR adjacency arrays, the targets of node i
+                       are indices[indptr[i]:indptr[i+1]]
+    inv_deg -- precomputed reciprocal of each node's out degree
+    p_in -- current node probabilities
+    p_out -- preallocated output array, overwritten with the updated
+             probabilities
+
+    Scattering straight into the preallocated output buffer fuses the
+    zeroing, scaling and accumulation of one update into a single pass
+    with no per-iteration allocation. Multiplying by the precomputed
+    reciprocal avoids a divide per node per iteration.
+    """
+    p_out[:] = 0.0
+    for u in range(len(p_in)):
+        start = indptr[u]
+        end = indptr[u + 1]
+        # probability mass of u split across its out edges
+        p = p_in[u] * inv_deg[u]
+        for k in range(start, end):
+            p_out[indices[k]] += p
+
+
+if njit is not None:
+    _pr_step = njit(_pr_step, cache=True, fastmath=True)
+
+
+if cuda is not None:
+    @cuda.jit
+    def _walk_kernel(indptr, indices, rng_states, n_steps, counts):
+        """CUDA kernel running one random walk per GPU thread"""
+        tid = cuda.grid(1)
+        if tid >= rng_states.shape[0]:
+            return
+        n = counts.shape[0]
+        # pick a random start node from this thread's RNG stream
+        cur = min(int(xoroshiro128p_uniform_float32(rng_states, tid) * n),
+                  n - 1)
+        for x in range(n_steps):
+            start = indptr[cur]
+            deg = indptr[cur + 1] - start
+            offset = min(
+                int(xoroshiro128p_uniform_float32(rng_states, tid) * deg),
+                deg - 1)
+            cur = indices[start + offset]
+        cuda.atomic.add(counts, cur, 1)
+
+
+def _walk_gpu(indptr, indices, n_iter, n_steps, n):
+    """Run the random walks on the GPU, one walker per CUDA thread
+
+    Same contract as _walk(). The adjacency arrays are copied to the
+    device once; every thread draws its steps from an independent
+    xoroshiro128p stream and the hits are merged with atomic adds.
+    """
+    d_indptr = cuda.to_device(indptr)
+    d_indices = cuda.to_device(indices)
+    d_counts = cuda.to_device(np.zeros(n, dtype=np.int64))
+    rng_states = create_xoroshiro128p_states(n_iter, seed=time.time_ns())
+    threads_per_block = 256
+    blocks = (n_iter + threads_per_block - 1) // threads_per_block
+    _walk_kernel[blocks, threads_per_block](
+        d_indptr, d_indices, rng_states, n_steps, d_counts)
+    return d_counts.copy_to_host() / n_iter
 
 
 def print_stats(graph):
         """Print number of nodes and edges in the given graph"""
-        print(f"{len(graph)} nodes and {sum(len(graph[x]) for x in graph)} edges")
+        print(f"{len(graph)} nodes and {len(graph.indices)} edges")
 
 
 def stochastic_page_rank(graph, n_iter=1_000_000, n_steps=100):
@@ -56,65 +259,150 @@ def stochastic_page_rank(graph, n_iter=1_000_000, n_steps=100):
     This function estimates the Page Rank by counting how frequently
     a random walk that starts on a random node will after n_steps end
     on each node of the given graph.
+    All n_iter walkers advance simultaneously as a NumPy index array
+    over the CSR adjacency, so each step is a handful of vectorized
+    array operations instead of n_iter interpreted dict lookups.
     """
-    hit_count = {}
-    # initialize hit_count[node] with 0 for all nodes
-    for x in graph:
-        hit_count[x] = 0
-
-    # repeat n_iterations times:
-    for x in range(n_iter):
-        # current_node <- randomly selected node
-        current_node = choice(list(graph))
-        # repeat n_steps times:
-        for x in range(n_steps):
-            # current_node with <- randomly chosen node among the out edges of current_node
-            current_node = choice(graph[current_node])
-        # hit_count[current_node] += 1/n_iterations
-        hit_count[current_node] += 1 / n_iter
-    return hit_count
+    n = len(graph)
+    indptr = graph.indptr
+    indices = graph.indices
+
+    if cuda is not None and cuda.is_available():
+        # run the walks on the GPU, one walker per thread
+        hit_count = _walk_gpu(indptr, indices, n_iter, n_steps, n)
+    else:
+        # PCG64 generator: batched draws come from single C calls
+        rng = np.random.default_rng()
+        # draw all start nodes up front in one vectorized call
+        starts = rng.integers(0, n, size=n_iter, dtype=np.int64)
+        if njit is not None:
+            # run the walks in the JIT-compiled kernel
+            hit_count = _walk(indptr, indices, starts, n_steps, n)
+        elif cython_walk is not None:
+            # run the walks in the prebuilt Cython kernel
+            hit_count = cython_walk.walk(indptr, indices, starts,
+                                         n_steps, n)
+        else:
+            # every walker begins on its precomputed start node
+            cur = starts
+            # repeat n_steps times: move all walkers to a randomly
+            # chosen node among the out edges of their current node
+            for x in range(n_steps):
+                deg = indptr[cur + 1] - indptr[cur]
+                offset = (rng.random(n_iter) * deg).astype(np.int64)
+                cur = indices[indptr[cur] + offset]
+            # count how many walkers ended on each node
+            hit_count = np.bincount(cur, minlength=n) / n_iter
+    return dict(zip(graph.urls, hit_count))
+
+
+def stochastic_page_rank_exact(graph, n_iter=100):
+    """Exact limit of the stochastic PageRank estimation
 
+    Parameters:
+    graph -- a graph object as returned by load_graph()
+    n_iter (int) -- number of probability distribution updates
 
-def distribution_page_rank(graph, n_iter=100):
+    Returns:
+    A dict that assigns each page its probability to be reached
+
+    The Monte Carlo walks in stochastic_page_rank only estimate the
+    stationary distribution of the random surfer, which the power
+    iteration in distribution_page_rank computes directly as the
+    leading eigenvector of the transition matrix. When the sampling
+    itself is not the point, use this instead of running walks: it is
+    both faster and free of sampling noise.
+    """
+    return distribution_page_rank(graph, n_iter)
+
+
+def distribution_page_rank(graph, n_iter=100, tol=1e-6):
     """Probabilistic PageRank estimation
 
     Parameters:
     graph -- a graph object as returned by load_graph()
-    n_iter (int) -- number of probability distribution updates
+    n_iter (int) -- maximum number of probability distribution updates
+    tol (float) -- stop early once the L1 change of the distribution
+                   falls below this threshold
 
     Returns:
     A dict that assigns each page its probability to be reached
 
     This function estimates the Page Rank by iteratively calculating
     the probability that a random walker is currently on any node.
+    The distribution update is a sparse matrix-vector product with the
+    transposed transition matrix, one BLAS-level call per iteration;
+    the iteration stops as soon as the distribution has converged.
+    """
+    n = len(graph)
+    # initialize node probabilities with the uniform distribution
+    p = np.full(n, 1 / n, dtype=np.float32)
+
+    if cp is not None and cp.cuda.is_available():
+        # run the power iteration on the GPU: every update is one
+        # cuSPARSE matrix-vector product
+        MT = cpsp.csr_matrix(build_transition_matrix(graph).T.tocsr())
+        p_gpu = cp.asarray(p)
+        for i in range(n_iter):
+            p_new = MT @ p_gpu
+            delta = float(cp.abs(p_new - p_gpu).sum())
+            p_gpu = p_new
+            if delta < tol:
+                break
+        p = cp.asnumpy(p_gpu)
+    elif njit is not None:
+        # double-buffered JIT kernel: scatter each update straight
+        # into a preallocated output array and swap the buffers
+        p_next = np.empty(n, dtype=np.float32)
+        # reciprocals of the out degrees, computed once
+        inv_deg = (1 / np.diff(graph.indptr)).astype(np.float32)
+        for i in range(n_iter):
+            _pr_step(graph.indptr, graph.indices, inv_deg, p, p_next)
+            delta = np.abs(p_next - p).sum()
+            p, p_next = p_next, p
+            if delta < tol:
+                break
+    else:
+        M = build_transition_matrix(graph)
+        # transpose once so each update is a single CSR matrix-vector
+        # product
+        MT = M.T.tocsr()
+        # repeat n_iterations times: propagate all probability mass
+        # along the out edges in one sparse matrix-vector product
+        for i in range(n_iter):
+            p_new = MT @ p
+            delta = np.abs(p_new - p).sum()
+            p = p_new
+            if delta < tol:
+                break
+    return dict(zip(graph.urls, p))
+
+
+def top_pages(ranking, n=20):
+    """Return the n highest ranked pages
+
+    Parameters:
+    ranking -- a dict assigning each page its page rank
+    n (int) -- number of pages to return
+
+    Returns:
+    A list of (url, rank) pairs in descending rank order
+
+    np.argpartition selects the top n in O(N); only those n entries
+    are sorted, instead of sorting the whole ranking.
     """
-    node_prob = {}
-
-    # initialize node_prob[node] = 1/(number of nodes) for all nodes
-    for x in graph:
-        node_prob[x] = 1 / len(graph)
-
-    # repeat n_iterations times:
-    for i in range(n_iter):
-        # initialize next_prob[node] = 0 for all nodes
-        next_prob = {}
-        for node in graph:
-            next_prob[node] = 0
-
-        # for each node
-        for node in graph:
-            # p <- node_prob[node] divided by its out degree
-            p = node_prob[node] / len(graph[node])
-            # for each target among out edges of node:
-            for target in graph[node]:
-                next_prob[target] += p
-        node_prob = next_prob
-    return node_prob
+    urls = list(ranking)
+    ranks = np.fromiter(ranking.values(), dtype=np.float64,
+                        count=len(urls))
+    n = min(n, len(urls))
+    idx = np.argpartition(ranks, -n)[-n:]
+    idx = idx[np.argsort(-ranks[idx])]
+    return [(urls[i], ranks[i]) for i in idx]
 
 
 def main():
     # Load the web structure from file
-    web = load_graph(open(WEB_DATA))
+    web = load_graph(open(WEB_DATA, 'rb'))
 
     # print information about the website
     print_stats(web)
@@ -134,8 +422,8 @@ def main():
     time_stochastic = stop - start
 
     # Show top 20 pages with their page rank and time it took to compute
-    top = sorted(ranking.items(), key=lambda item: item[1], reverse=True)
-    print('\n'.join(f'{100*v:.2f}\t{k}' for k,v in top[:20]))
+    top = top_pages(ranking)
+    print('\n'.join(f'{100*v:.2f}\t{k}' for k,v in top))
     print(f'Calculation took {time_stochastic:.2f} seconds.\n')
 
     # Measure how long it takes to estimate PageRank through probabilities
@@ -147,8 +435,8 @@ def main():
     time_probabilistic = stop - start
 
     # Show top 20 pages with their page rank and time it took to compute
-    top = sorted(ranking.items(), key=lambda item: item[1], reverse=True)
-    print('\n'.join(f'{100*v:.2f}\t{k}' for k,v in top[:20]))
+    top = top_pages(ranking)
+    print('\n'.join(f'{100*v:.2f}\t{k}' for k,v in top))
     print(f'Calculation took {time_probabilistic:.2f} seconds.\n')
 
     # Compare the compute time of the two methods
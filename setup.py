@@ -0,0 +1,8 @@
+"""Build script for the optional Cython walk kernel
+
+Usage: python setup.py build_ext --inplace
+"""
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(ext_modules=cythonize('walk.pyx'))
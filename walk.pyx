@@ -0,0 +1,41 @@
+# cython: boundscheck=False, wraparound=False
+"""Cython random walk kernel for stochastic PageRank
+
+Fallback walk kernel for installations without Numba. Offers the same
+contract as page_rank._walk but uses the C library rand() for the step
+choices. Build in place with:
+
+    python setup.py build_ext --inplace
+"""
+import numpy as np
+
+from libc.stdlib cimport rand
+
+
+cpdef walk(int[::1] indptr, int[::1] indices, long[::1] starts,
+           int n_steps, int n):
+    """Run one random walk of n_steps per entry of starts
+
+    Parameters:
+    indptr, indices -- CSR adjacency arrays, the targets of node i
+                       are indices[indptr[i]:indptr[i+1]]
+    starts -- array of start node ids, one per walk
+    n_steps (int) -- number of followed links before a walk is stopped
+    n (int) -- number of nodes in the graph
+
+    Returns:
+    An array assigning each node id its hit frequency
+    """
+    cdef long n_iter = starts.shape[0]
+    counts_arr = np.zeros(n, dtype=np.int64)
+    cdef long[::1] counts = counts_arr
+    cdef long it
+    cdef int cur, x, start, deg
+    for it in range(n_iter):
+        cur = <int>starts[it]
+        for x in range(n_steps):
+            start = indptr[cur]
+            deg = indptr[cur + 1] - start
+            cur = indices[start + rand() % deg]
+        counts[cur] += 1
+    return counts_arr / <double>n_iter